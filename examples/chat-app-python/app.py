@@ -5,14 +5,19 @@ Una aplicación de chat en tiempo real construida con FastAPI, WebSockets y Pyth
 """
 
 import asyncio
-import json
 import logging
+import re
+import sys
 import uuid
+from collections import deque
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, List, Optional, Set
+from itertools import islice
+from typing import Deque, Dict, Optional
 
+import orjson
 import uvicorn
-from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
@@ -28,65 +33,246 @@ app = FastAPI(title="PAMPA Chat Python", version="1.0.0")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
+# La página principal no depende del request: se renderiza una sola vez al iniciar
+CACHED_INDEX = templates.get_template("index.html").render({"request": None}).encode()
+
+# Serialización JSON con orjson: devuelve bytes listos para enviar como frame binario
+_dumps = orjson.dumps
+
+# Modelos del chat: dataclasses con __slots__ (menos memoria que un dict por objeto).
+# orjson las serializa directamente con los mismos campos que los dicts anteriores.
+@dataclass(slots=True)
+class User:
+    """Usuario registrado en el chat"""
+    id: str
+    username: str
+    avatar: str
+    joined_at: str
+    current_room: str
+
+@dataclass(slots=True)
+class Room:
+    """Sala de chat"""
+    id: str
+    name: str
+    description: str
+    is_public: bool
+    max_users: int
+    created_by: str
+
+@dataclass(slots=True)
+class Message:
+    """Mensaje publicado en una sala"""
+    id: str
+    type: str
+    user: User
+    content: str
+    room_id: str
+    timestamp: str
+
 class ConnectionManager:
     """Maneja las conexiones WebSocket y la lógica del chat"""
     
+    HELP_TEXT = """
+Comandos disponibles:
+/help - Muestra esta ayuda
+/rooms - Lista todas las salas
+/users - Lista usuarios en la sala actual
+/join <sala> - Une a una sala específica
+/nick <nuevo_nombre> - Cambia tu nombre de usuario
+/stats - Muestra estadísticas de la sala actual
+    """.strip()
+    
+    # Máximo de payloads pendientes por conexión antes de desconectar a un cliente que no lee
+    MAX_PENDING = 512
+    
     def __init__(self):
         # Conexiones activas: {connection_id: websocket}
         self.active_connections: Dict[str, WebSocket] = {}
         
         # Usuarios: {connection_id: user_info}
-        self.users: Dict[str, Dict] = {}
+        self.users: Dict[str, User] = {}
         
-        # Salas: {room_id: room_info}
-        self.rooms: Dict[str, Dict] = {}
+        # Sala actual por conexión: {connection_id: room_id}, espejo de User.current_room
+        self.current_room: Dict[str, str] = {}
+        
+        # Índice de nombres: {username.lower(): connection_id}
+        self.username_index: Dict[str, str] = {}
         
-        # Usuarios por sala: {room_id: set(connection_ids)}
-        self.room_users: Dict[str, Set[str]] = {}
+        # Salas: {room_id: room_info}
+        self.rooms: Dict[str, Room] = {}
+        
+        # Usuarios por sala: {room_id: {connection_id: None}}, un dict usado como set ordenado
+        self.room_users: Dict[str, Dict[str, None]] = {}
+        
+        # Espejos de room_users para /rooms y /users: {room_id: n} y {room_id: {connection_id: username}}
+        self.room_user_count: Dict[str, int] = {}
+        self.room_usernames: Dict[str, Dict[str, str]] = {}
+        
+        # Historial de mensajes: {room_id: deque(messages)}, acotado a los últimos 100
+        self.message_history: Dict[str, Deque[Message]] = {}
+        
+        # Cola de salida por conexión: {connection_id: deque(payloads)}, drenada por un writer
+        # que se despierta con un future en lugar de un asyncio.Queue
+        self.out_queues: Dict[str, Deque[Optional[bytes]]] = {}
+        self.out_wakers: Dict[str, asyncio.Future] = {}
+        self.out_writers: Dict[str, asyncio.Task] = {}
+        
+        # Timestamp ISO compartido por todos los eventos del mismo tick
+        self._cached_ts: Optional[str] = None
+        
+        # Tabla de comandos: {comando: handler}
+        self._commands = {
+            '/help': self._cmd_help,
+            '/rooms': self._cmd_rooms,
+            '/users': self._cmd_users,
+            '/join': self._cmd_join,
+            '/nick': self._cmd_nick,
+            '/stats': self._cmd_stats,
+        }
         
-        # Historial de mensajes: {room_id: [messages]}
-        self.message_history: Dict[str, List[Dict]] = {}
+        # Parser de comandos compilado a partir de la tabla: /<comando> [argumentos]
+        self._command_re = re.compile(
+            r'^(?P<cmd>' + '|'.join(re.escape(cmd) for cmd in self._commands) + r')(?:\s+(?P<args>.*?))?\s*$',
+            re.IGNORECASE | re.DOTALL
+        )
         
         self._initialize_default_rooms()
     
     def _initialize_default_rooms(self):
         """Inicializar salas predeterminadas"""
         default_rooms = [
-            {
-                'id': 'general',
-                'name': 'General',
-                'description': 'Sala principal para conversaciones generales',
-                'is_public': True,
-                'max_users': 50,
-                'created_by': 'system'
-            },
-            {
-                'id': 'tecnologia',
-                'name': 'Tecnología',
-                'description': 'Discusiones sobre tecnología y programación',
-                'is_public': True,
-                'max_users': 30,
-                'created_by': 'system'
-            },
-            {
-                'id': 'python',
-                'name': 'Python',
-                'description': 'Todo sobre Python y sus frameworks',
-                'is_public': True,
-                'max_users': 25,
-                'created_by': 'system'
-            }
+            Room(
+                id='general',
+                name='General',
+                description='Sala principal para conversaciones generales',
+                is_public=True,
+                max_users=50,
+                created_by='system'
+            ),
+            Room(
+                id='tecnologia',
+                name='Tecnología',
+                description='Discusiones sobre tecnología y programación',
+                is_public=True,
+                max_users=30,
+                created_by='system'
+            ),
+            Room(
+                id='python',
+                name='Python',
+                description='Todo sobre Python y sus frameworks',
+                is_public=True,
+                max_users=25,
+                created_by='system'
+            )
         ]
         
         for room in default_rooms:
-            self.rooms[room['id']] = room
-            self.room_users[room['id']] = set()
-            self.message_history[room['id']] = []
+            self.rooms[room.id] = room
+            self.room_users[room.id] = {}
+            self.room_user_count[room.id] = 0
+            self.room_usernames[room.id] = {}
+            self.message_history[room.id] = deque(maxlen=100)
+    
+    def _now_iso(self) -> str:
+        """Devuelve el timestamp ISO actual, cacheado hasta el siguiente tick del event loop"""
+        if self._cached_ts is None:
+            self._cached_ts = datetime.now().isoformat()
+            asyncio.get_running_loop().call_soon(self._clear_cached_ts)
+        return self._cached_ts
+    
+    def _clear_cached_ts(self):
+        """Invalida el timestamp cacheado al comenzar un nuevo tick"""
+        self._cached_ts = None
+    
+    def _enqueue(self, connection_id: str, payload: Optional[bytes]):
+        """Encola un payload para una conexión y despierta a su writer (None lo detiene)"""
+        if not self._try_enqueue(connection_id, payload):
+            self._close_connection(connection_id, code=1008)
+    
+    def _try_enqueue(self, connection_id: str, payload: Optional[bytes]) -> bool:
+        """Como _enqueue, pero sin desconectar: devuelve False si la cola está llena"""
+        queue = self.out_queues.get(connection_id)
+        if queue is None:
+            return True
+        
+        # Un cliente que no lee no puede acumular memoria sin límite en el servidor
+        if len(queue) >= self.MAX_PENDING:
+            logger.warning(f"Cola de salida llena para {connection_id}, desconectando")
+            return False
+        
+        queue.append(payload)
+        waker = self.out_wakers[connection_id]
+        if not waker.done():
+            waker.set_result(None)
+        return True
+    
+    async def _writer_loop(self, connection_id: str, websocket: WebSocket):
+        """Envía en orden los payloads encolados, agrupando en un frame (array JSON) los pendientes"""
+        loop = asyncio.get_running_loop()
+        queue = self.out_queues[connection_id]
+        
+        while True:
+            await self.out_wakers[connection_id]
+            self.out_wakers[connection_id] = loop.create_future()
+            
+            while queue:
+                pending = []
+                closing = False
+                while queue and not closing:
+                    payload = queue.popleft()
+                    if payload is None:
+                        closing = True
+                    else:
+                        pending.append(payload)
+                
+                if pending:
+                    # Con un solo payload pendiente se envía tal cual, sin armar un frame nuevo
+                    if len(pending) == 1:
+                        frame = pending[0]
+                    else:
+                        frame = b'[' + b','.join(pending) + b']'
+                    try:
+                        await websocket.send_bytes(frame)
+                    except Exception as e:
+                        logger.error(f"Error enviando mensaje a {connection_id}: {e}")
+                        self._close_connection(connection_id, code=1011)
+                        return
+                
+                if closing:
+                    return
+    
+    def _close_connection(self, connection_id: str, code: int):
+        """Desconecta al usuario y cierra su websocket para que termine el loop de recepción"""
+        websocket = self.active_connections.get(connection_id)
+        self.disconnect(connection_id)
+        if websocket is not None:
+            asyncio.create_task(self._close_websocket(websocket, code))
+    
+    async def _close_websocket(self, websocket: WebSocket, code: int):
+        """Cierra un websocket ignorando errores si ya estaba cerrado"""
+        try:
+            await websocket.close(code=code)
+        except Exception as e:
+            logger.debug(f"Error cerrando websocket: {e}")
+    
+    async def drain(self, connection_id: str, timeout: float = 5.0):
+        """Espera a que el writer envíe lo ya encolado para una conexión"""
+        writer = self.out_writers.get(connection_id)
+        if writer is None:
+            return
+        
+        self._enqueue(connection_id, None)
+        await asyncio.wait({writer}, timeout=timeout)
     
     async def connect(self, websocket: WebSocket, connection_id: str):
         """Acepta una nueva conexión WebSocket"""
         await websocket.accept()
         self.active_connections[connection_id] = websocket
+        self.out_queues[connection_id] = deque()
+        self.out_wakers[connection_id] = asyncio.get_running_loop().create_future()
+        self.out_writers[connection_id] = asyncio.create_task(self._writer_loop(connection_id, websocket))
         logger.info(f"Nueva conexión: {connection_id}")
     
     def disconnect(self, connection_id: str):
@@ -94,47 +280,73 @@ class ConnectionManager:
         if connection_id in self.active_connections:
             del self.active_connections[connection_id]
         
-        # Remover usuario de todas las salas
-        user_rooms = []
-        for room_id, users in self.room_users.items():
-            if connection_id in users:
-                users.remove(connection_id)
-                user_rooms.append(room_id)
-        
-        # Notificar a las salas sobre la desconexión
-        if connection_id in self.users:
-            user = self.users[connection_id]
-            for room_id in user_rooms:
-                asyncio.create_task(self._broadcast_to_room(room_id, {
+        # Detener el writer de la conexión (salvo que sea quien llama)
+        self.out_queues.pop(connection_id, None)
+        self.out_wakers.pop(connection_id, None)
+        writer = self.out_writers.pop(connection_id, None)
+        if writer and writer is not asyncio.current_task():
+            writer.cancel()
+        
+        # join_room garantiza que el usuario está en una sola sala: la actual
+        user = self.users.pop(connection_id, None)
+        if user is not None:
+            self.username_index.pop(user.username.lower(), None)
+            
+            room_id = self.current_room.pop(connection_id, None)
+            if self._remove_from_room(connection_id, room_id):
+                # Notificar a la sala sobre la desconexión
+                self._broadcast_to_room(room_id, {
                     'type': 'user_left',
                     'user': user,
                     'room_id': room_id,
-                    'timestamp': datetime.now().isoformat()
-                }))
-            
-            del self.users[connection_id]
+                    'timestamp': self._now_iso()
+                })
         
         logger.info(f"Desconectado: {connection_id}")
     
+    def _add_to_room(self, connection_id: str, room_id: str):
+        """Agrega una conexión a una sala manteniendo contador y nombres sincronizados"""
+        members = self.room_users[room_id]
+        if connection_id not in members:
+            members[connection_id] = None
+            self.room_user_count[room_id] += 1
+        self.room_usernames[room_id][connection_id] = self.users[connection_id].username
+    
+    def _remove_from_room(self, connection_id: str, room_id: str) -> bool:
+        """Quita una conexión de una sala; devuelve False si no era miembro"""
+        members = self.room_users.get(room_id)
+        if members is None or connection_id not in members:
+            return False
+        
+        del members[connection_id]
+        self.room_user_count[room_id] -= 1
+        del self.room_usernames[room_id][connection_id]
+        return True
+    
     async def register_user(self, connection_id: str, username: str) -> Dict:
         """Registra un nuevo usuario"""
+        if connection_id not in self.active_connections:
+            return {'success': False, 'error': 'Conexión cerrada'}
+        
         if connection_id in self.users:
             return {'success': False, 'error': 'Usuario ya registrado'}
         
         # Verificar si el nombre de usuario ya existe
-        for user in self.users.values():
-            if user['username'].lower() == username.lower():
-                return {'success': False, 'error': 'Nombre de usuario ya en uso'}
-        
-        user = {
-            'id': connection_id,
-            'username': username,
-            'avatar': self._generate_avatar_color(),
-            'joined_at': datetime.now().isoformat(),
-            'current_room': 'general'
-        }
+        username_key = username.lower()
+        if username_key in self.username_index:
+            return {'success': False, 'error': 'Nombre de usuario ya en uso'}
+        
+        user = User(
+            id=connection_id,
+            username=username,
+            avatar=self._generate_avatar_color(),
+            joined_at=self._now_iso(),
+            current_room='general'
+        )
         
         self.users[connection_id] = user
+        self.current_room[connection_id] = user.current_room
+        self.username_index[username_key] = connection_id
         
         # Unir automáticamente a la sala general
         await self.join_room(connection_id, 'general')
@@ -160,39 +372,39 @@ class ConnectionManager:
         user = self.users[connection_id]
         
         # Verificar límite de usuarios
-        if len(self.room_users[room_id]) >= room['max_users']:
+        if self.room_user_count[room_id] >= room.max_users:
             return {'success': False, 'error': 'Sala llena'}
         
         # Remover de sala anterior
-        old_room = user.get('current_room')
-        if old_room and old_room in self.room_users:
-            self.room_users[old_room].discard(connection_id)
-            await self._broadcast_to_room(old_room, {
+        old_room = self.current_room.get(connection_id)
+        if old_room and self._remove_from_room(connection_id, old_room):
+            self._broadcast_to_room(old_room, {
                 'type': 'user_left',
                 'user': user,
                 'room_id': old_room,
-                'timestamp': datetime.now().isoformat()
+                'timestamp': self._now_iso()
             })
         
         # Agregar a nueva sala
-        self.room_users[room_id].add(connection_id)
-        user['current_room'] = room_id
+        self._add_to_room(connection_id, room_id)
+        user.current_room = room_id
+        self.current_room[connection_id] = room_id
         
         # Notificar a la sala
-        await self._broadcast_to_room(room_id, {
+        self._broadcast_to_room(room_id, {
             'type': 'user_joined',
             'user': user,
             'room_id': room_id,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': self._now_iso()
         })
         
         # Enviar historial de mensajes al usuario
-        if connection_id in self.active_connections:
-            await self.active_connections[connection_id].send_text(json.dumps({
-                'type': 'message_history',
-                'messages': self.message_history[room_id][-50:],  # Últimos 50 mensajes
-                'room_id': room_id
-            }))
+        history = self.message_history[room_id]
+        self._enqueue(connection_id, _dumps({
+            'type': 'message_history',
+            'messages': list(islice(history, max(len(history) - 50, 0), None)),  # Últimos 50 mensajes
+            'room_id': room_id
+        }))
         
         return {'success': True, 'room': room}
     
@@ -202,7 +414,7 @@ class ConnectionManager:
             return {'success': False, 'error': 'Usuario no registrado'}
         
         user = self.users[connection_id]
-        room_id = user['current_room']
+        room_id = self.current_room[connection_id]
         
         if not room_id or room_id not in self.rooms:
             return {'success': False, 'error': 'No estás en una sala válida'}
@@ -212,24 +424,20 @@ class ConnectionManager:
             return await self._handle_command(connection_id, content)
         
         # Crear mensaje
-        message = {
-            'id': str(uuid.uuid4()),
-            'type': message_type,
-            'user': user,
-            'content': content,
-            'room_id': room_id,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        # Agregar al historial
+        message = Message(
+            id=str(uuid.uuid4()),
+            type=message_type,
+            user=user,
+            content=content,
+            room_id=room_id,
+            timestamp=self._now_iso()
+        )
+        
+        # Agregar al historial (el deque descarta los mensajes más antiguos)
         self.message_history[room_id].append(message)
         
-        # Mantener solo los últimos 100 mensajes por sala
-        if len(self.message_history[room_id]) > 100:
-            self.message_history[room_id] = self.message_history[room_id][-100:]
-        
         # Broadcast a la sala
-        await self._broadcast_to_room(room_id, {
+        self._broadcast_to_room(room_id, {
             'type': 'new_message',
             'message': message
         })
@@ -238,153 +446,151 @@ class ConnectionManager:
     
     async def _handle_command(self, connection_id: str, command: str) -> Dict:
         """Maneja comandos especiales del chat"""
-        user = self.users[connection_id]
-        parts = command.split(' ', 1)
-        cmd = parts[0].lower()
-        args = parts[1] if len(parts) > 1 else ''
+        match = self._command_re.match(command)
+        if not match:
+            cmd = command.split(' ', 1)[0].lower()
+            await self._send_system_message(connection_id, f"Comando desconocido: {cmd}")
+            return {'success': False}
         
-        if cmd == '/help':
-            help_text = """
-Comandos disponibles:
-/help - Muestra esta ayuda
-/rooms - Lista todas las salas
-/users - Lista usuarios en la sala actual
-/join <sala> - Une a una sala específica
-/nick <nuevo_nombre> - Cambia tu nombre de usuario
-/stats - Muestra estadísticas de la sala actual
-            """.strip()
-            
-            await self._send_system_message(connection_id, help_text)
-            return {'success': True}
-        
-        elif cmd == '/rooms':
-            rooms_info = []
-            for room_id, room in self.rooms.items():
-                user_count = len(self.room_users[room_id])
-                rooms_info.append(f"• {room['name']} ({user_count}/{room['max_users']}) - {room['description']}")
-            
-            message = "Salas disponibles:\n" + "\n".join(rooms_info)
-            await self._send_system_message(connection_id, message)
-            return {'success': True}
-        
-        elif cmd == '/users':
-            room_id = user['current_room']
-            users_in_room = []
-            for uid in self.room_users[room_id]:
-                if uid in self.users:
-                    users_in_room.append(self.users[uid]['username'])
-            
-            message = f"Usuarios en {self.rooms[room_id]['name']}: {', '.join(users_in_room)}"
-            await self._send_system_message(connection_id, message)
-            return {'success': True}
-        
-        elif cmd == '/join':
-            if not args:
-                await self._send_system_message(connection_id, "Uso: /join <nombre_sala>")
-                return {'success': False}
-            
-            # Buscar sala por nombre o ID
-            target_room = None
-            for room_id, room in self.rooms.items():
-                if room_id == args.lower() or room['name'].lower() == args.lower():
-                    target_room = room_id
-                    break
-            
-            if not target_room:
-                await self._send_system_message(connection_id, f"Sala '{args}' no encontrada")
-                return {'success': False}
-            
-            result = await self.join_room(connection_id, target_room)
-            if result['success']:
-                await self._send_system_message(connection_id, f"Te has unido a {self.rooms[target_room]['name']}")
-            else:
-                await self._send_system_message(connection_id, f"Error: {result['error']}")
-            
-            return result
+        handler = self._commands[match['cmd'].lower()]
+        return await handler(connection_id, match['args'] or '')
+    
+    async def _cmd_help(self, connection_id: str, args: str) -> Dict:
+        """/help - Muestra la ayuda"""
+        await self._send_system_message(connection_id, self.HELP_TEXT)
+        return {'success': True}
+    
+    async def _cmd_rooms(self, connection_id: str, args: str) -> Dict:
+        """/rooms - Lista todas las salas"""
+        rooms_info = []
+        for room_id, room in self.rooms.items():
+            user_count = self.room_user_count[room_id]
+            rooms_info.append(f"• {room.name} ({user_count}/{room.max_users}) - {room.description}")
+        
+        message = "Salas disponibles:\n" + "\n".join(rooms_info)
+        await self._send_system_message(connection_id, message)
+        return {'success': True}
+    
+    async def _cmd_users(self, connection_id: str, args: str) -> Dict:
+        """/users - Lista usuarios en la sala actual"""
+        room_id = self.current_room[connection_id]
+        users_in_room = ', '.join(self.room_usernames[room_id].values())
+        
+        message = f"Usuarios en {self.rooms[room_id].name}: {users_in_room}"
+        await self._send_system_message(connection_id, message)
+        return {'success': True}
+    
+    async def _cmd_join(self, connection_id: str, args: str) -> Dict:
+        """/join <sala> - Une a una sala específica"""
+        if not args:
+            await self._send_system_message(connection_id, "Uso: /join <nombre_sala>")
+            return {'success': False}
         
-        elif cmd == '/nick':
-            if not args:
-                await self._send_system_message(connection_id, "Uso: /nick <nuevo_nombre>")
-                return {'success': False}
-            
-            # Verificar si el nombre ya existe
-            for uid, u in self.users.items():
-                if uid != connection_id and u['username'].lower() == args.lower():
-                    await self._send_system_message(connection_id, "Ese nombre ya está en uso")
-                    return {'success': False}
-            
-            old_name = user['username']
-            user['username'] = args
-            
-            # Notificar a la sala actual
-            room_id = user['current_room']
-            await self._broadcast_to_room(room_id, {
-                'type': 'user_renamed',
-                'old_name': old_name,
-                'new_name': args,
-                'user': user,
-                'room_id': room_id,
-                'timestamp': datetime.now().isoformat()
-            })
-            
-            return {'success': True}
+        # Buscar sala por nombre o ID
+        target_room = None
+        for room_id, room in self.rooms.items():
+            if room_id == args.lower() or room.name.lower() == args.lower():
+                target_room = room_id
+                break
         
-        elif cmd == '/stats':
-            room_id = user['current_room']
-            room = self.rooms[room_id]
-            user_count = len(self.room_users[room_id])
-            message_count = len(self.message_history[room_id])
-            
-            stats = f"""
-Estadísticas de {room['name']}:
-• Usuarios conectados: {user_count}/{room['max_users']}
-• Mensajes enviados: {message_count}
-• Creada por: {room['created_by']}
-            """.strip()
-            
-            await self._send_system_message(connection_id, stats)
-            return {'success': True}
+        if not target_room:
+            await self._send_system_message(connection_id, f"Sala '{args}' no encontrada")
+            return {'success': False}
         
+        result = await self.join_room(connection_id, target_room)
+        if result['success']:
+            await self._send_system_message(connection_id, f"Te has unido a {self.rooms[target_room].name}")
         else:
-            await self._send_system_message(connection_id, f"Comando desconocido: {cmd}")
+            await self._send_system_message(connection_id, f"Error: {result['error']}")
+        
+        return result
+    
+    async def _cmd_nick(self, connection_id: str, args: str) -> Dict:
+        """/nick <nuevo_nombre> - Cambia el nombre de usuario"""
+        if not args:
+            await self._send_system_message(connection_id, "Uso: /nick <nuevo_nombre>")
+            return {'success': False}
+        
+        # Verificar si el nombre ya existe
+        new_key = args.lower()
+        owner = self.username_index.get(new_key)
+        if owner is not None and owner != connection_id:
+            await self._send_system_message(connection_id, "Ese nombre ya está en uso")
             return {'success': False}
+        
+        user = self.users[connection_id]
+        old_name = user.username
+        del self.username_index[old_name.lower()]
+        self.username_index[new_key] = connection_id
+        user.username = args
+        
+        room_id = self.current_room[connection_id]
+        room_usernames = self.room_usernames.get(room_id)
+        if room_usernames is not None and connection_id in room_usernames:
+            room_usernames[connection_id] = args
+        
+        # Notificar a la sala actual
+        self._broadcast_to_room(room_id, {
+            'type': 'user_renamed',
+            'old_name': old_name,
+            'new_name': args,
+            'user': user,
+            'room_id': room_id,
+            'timestamp': self._now_iso()
+        })
+        
+        return {'success': True}
+    
+    async def _cmd_stats(self, connection_id: str, args: str) -> Dict:
+        """/stats - Muestra estadísticas de la sala actual"""
+        room_id = self.current_room[connection_id]
+        room = self.rooms[room_id]
+        user_count = self.room_user_count[room_id]
+        message_count = len(self.message_history[room_id])
+        
+        stats = f"""
+Estadísticas de {room.name}:
+• Usuarios conectados: {user_count}/{room.max_users}
+• Mensajes enviados: {message_count}
+• Creada por: {room.created_by}
+        """.strip()
+        
+        await self._send_system_message(connection_id, stats)
+        return {'success': True}
     
     async def _send_system_message(self, connection_id: str, content: str):
         """Envía un mensaje del sistema a un usuario específico"""
-        if connection_id in self.active_connections:
-            await self.active_connections[connection_id].send_text(json.dumps({
-                'type': 'system_message',
-                'content': content,
-                'timestamp': datetime.now().isoformat()
-            }))
+        self._enqueue(connection_id, _dumps({
+            'type': 'system_message',
+            'content': content,
+            'timestamp': self._now_iso()
+        }))
     
-    async def _broadcast_to_room(self, room_id: str, message: Dict):
-        """Envía un mensaje a todos los usuarios de una sala"""
-        if room_id not in self.room_users:
+    def _broadcast_to_room(self, room_id: str, message: Dict):
+        """Encola un mensaje para todos los usuarios de una sala"""
+        members = self.room_users.get(room_id)
+        if members is None:
             return
         
-        disconnected = []
-        for connection_id in self.room_users[room_id].copy():
-            if connection_id in self.active_connections:
-                try:
-                    await self.active_connections[connection_id].send_text(json.dumps(message))
-                except Exception as e:
-                    logger.error(f"Error enviando mensaje a {connection_id}: {e}")
-                    disconnected.append(connection_id)
-            else:
-                disconnected.append(connection_id)
-        
-        # Limpiar conexiones desconectadas
-        for connection_id in disconnected:
-            self.disconnect(connection_id)
+        # Serializar una sola vez y encolar ya: los destinatarios son los miembros
+        # actuales de la sala y el writer de cada conexión agrupa lo pendiente
+        payload = _dumps(message)
+        overflowed = []
+        for connection_id in members:
+            if not self._try_enqueue(connection_id, payload):
+                overflowed.append(connection_id)
+        
+        # Desconectar después de recorrer la sala, que disconnect() modifica
+        for connection_id in overflowed:
+            self._close_connection(connection_id, code=1008)
 
 # Instancia global del manager
 manager = ConnectionManager()
 
 @app.get("/", response_class=HTMLResponse)
-async def get_chat_page(request: Request):
+async def get_chat_page():
     """Página principal del chat"""
-    return templates.TemplateResponse("index.html", {"request": request})
+    return HTMLResponse(content=CACHED_INDEX)
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -396,31 +602,30 @@ async def websocket_endpoint(websocket: WebSocket):
         while True:
             # Recibir mensaje del cliente
             data = await websocket.receive_text()
-            message = json.loads(data)
+            message = orjson.loads(data)
             
             message_type = message.get('type')
             
             if message_type == 'register':
                 username = message.get('username', '').strip()
                 if not username:
-                    await websocket.send_text(json.dumps({
+                    manager._enqueue(connection_id, _dumps({
                         'type': 'error',
                         'message': 'Nombre de usuario requerido'
                     }))
                     continue
                 
                 result = await manager.register_user(connection_id, username)
-                await websocket.send_text(json.dumps({
-                    'type': 'registration_result',
-                    **result
-                }))
+                result['type'] = 'registration_result'
+                manager._enqueue(connection_id, _dumps(result))
             
             elif message_type == 'message':
                 content = message.get('content', '').strip()
                 if content:
                     result = await manager.send_message(connection_id, content)
-                    if not result['success']:
-                        await websocket.send_text(json.dumps({
+                    # Los comandos que fallan sin 'error' ya respondieron con un mensaje del sistema
+                    if not result['success'] and result.get('error'):
+                        manager._enqueue(connection_id, _dumps({
                             'type': 'error',
                             'message': result['error']
                         }))
@@ -429,16 +634,20 @@ async def websocket_endpoint(websocket: WebSocket):
                 room_id = message.get('room_id')
                 if room_id:
                     result = await manager.join_room(connection_id, room_id)
-                    await websocket.send_text(json.dumps({
-                        'type': 'join_result',
-                        **result
-                    }))
+                    result['type'] = 'join_result'
+                    manager._enqueue(connection_id, _dumps(result))
     
     except WebSocketDisconnect:
         manager.disconnect(connection_id)
     except Exception as e:
         logger.error(f"Error en WebSocket {connection_id}: {e}")
+        # El socket sigue abierto: enviar las respuestas pendientes antes de desconectar
+        await manager.drain(connection_id)
         manager.disconnect(connection_id)
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
+    # uvloop acelera futures, sockets y call_soon del event loop (no disponible en Windows)
+    loop = "asyncio" if sys.platform == "win32" else "uvloop"
+    # Los mensajes del chat son pequeños: comprimir cada frame cuesta más CPU de lo que ahorra
+    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info", loop=loop,
+                ws_per_message_deflate=False)
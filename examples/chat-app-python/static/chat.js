@@ -11,6 +11,7 @@ class ChatClient {
         this.currentRoom = null;
         this.rooms = new Map();
         this.users = new Map();
+        this.decoder = new TextDecoder();
 
         this.initializeElements();
         this.bindEvents();
@@ -81,6 +82,8 @@ class ChatClient {
 
         try {
             this.ws = new WebSocket(wsUrl);
+            // El servidor envía el JSON en frames binarios (UTF-8)
+            this.ws.binaryType = 'arraybuffer';
 
             this.ws.onopen = () => {
                 console.log('Conectado al servidor WebSocket');
@@ -88,7 +91,15 @@ class ChatClient {
             };
 
             this.ws.onmessage = (event) => {
-                this.handleMessage(JSON.parse(event.data));
+                const raw = typeof event.data === 'string' ? event.data : this.decoder.decode(event.data);
+                const data = JSON.parse(raw);
+
+                // Un frame trae un mensaje (objeto) o varios agrupados (array)
+                if (Array.isArray(data)) {
+                    data.forEach(message => this.handleMessage(message));
+                } else {
+                    this.handleMessage(data);
+                }
             };
 
             this.ws.onclose = () => {
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Tests del ConnectionManager con un WebSocket falso.
+Ejecutar desde este directorio: python -m unittest test_app
+"""
+
+import asyncio
+import json
+import os
+import unittest
+
+# app.py resuelve static/ y templates/ relativo al directorio de trabajo
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+from app import ConnectionManager  # noqa: E402
+
+
+class FakeWebSocket:
+    """WebSocket mínimo que guarda los frames enviados"""
+
+    def __init__(self):
+        self.frames = []
+        self.closed_code = None
+
+    async def accept(self):
+        pass
+
+    async def send_bytes(self, data: bytes):
+        self.frames.append(json.loads(data))
+
+    async def close(self, code: int = 1000):
+        self.closed_code = code
+
+    @property
+    def messages(self):
+        """Mensajes recibidos, desagrupando los frames con varios mensajes"""
+        result = []
+        for frame in self.frames:
+            result.extend(frame if isinstance(frame, list) else [frame])
+        return result
+
+    def of_type(self, message_type: str):
+        """Mensajes recibidos de un tipo"""
+        return [m for m in self.messages if m['type'] == message_type]
+
+
+class StuckWebSocket(FakeWebSocket):
+    """WebSocket de un cliente que no lee: los envíos nunca terminan"""
+
+    async def send_bytes(self, data: bytes):
+        await asyncio.Event().wait()
+
+
+async def settle():
+    """Deja correr a los writers hasta que envíen lo pendiente"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class ConnectionManagerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.manager = ConnectionManager()
+
+    async def connect(self, connection_id: str, username: str = None, websocket=None):
+        websocket = websocket or FakeWebSocket()
+        await self.manager.connect(websocket, connection_id)
+        if username:
+            await self.manager.register_user(connection_id, username)
+        await settle()
+        return websocket
+
+    async def test_register_does_not_send_own_user_left(self):
+        alice = await self.connect('a', 'Alice')
+
+        self.assertEqual(alice.of_type('user_left'), [])
+        self.assertEqual(len(alice.of_type('user_joined')), 1)
+
+    async def test_same_tick_join_does_not_duplicate_message(self):
+        await self.connect('a', 'Alice')
+        bob = await self.connect('b', 'Bob')
+        await self.manager.join_room('a', 'python')
+        await settle()
+        bob.frames.clear()
+
+        await self.manager.send_message('a', 'hola')
+        await self.manager.join_room('b', 'python')
+        await settle()
+
+        live = [m for m in bob.of_type('new_message') if m['message']['content'] == 'hola']
+        history = [m for h in bob.of_type('message_history') for m in h['messages'] if m['content'] == 'hola']
+        self.assertEqual((len(live), len(history)), (0, 1))
+
+    async def test_same_tick_leave_still_receives_message(self):
+        alice = await self.connect('a', 'Alice')
+        await self.connect('b', 'Bob')
+        alice.frames.clear()
+
+        await self.manager.send_message('b', 'chau')
+        await self.manager.join_room('a', 'python')
+        await settle()
+
+        contents = [m['message']['content'] for m in alice.of_type('new_message')]
+        self.assertEqual(contents, ['chau'])
+
+    async def test_pending_messages_are_batched_in_order(self):
+        alice = await self.connect('a', 'Alice')
+        alice.frames.clear()
+
+        await self.manager.send_message('a', 'uno')
+        await self.manager.send_message('a', 'dos')
+        await self.manager.send_message('a', 'tres')
+        await settle()
+
+        self.assertEqual(len(alice.frames), 1)
+        self.assertIsInstance(alice.frames[0], list)
+        self.assertEqual([m['message']['content'] for m in alice.frames[0]], ['uno', 'dos', 'tres'])
+
+    async def test_single_pending_message_is_sent_as_object(self):
+        alice = await self.connect('a', 'Alice')
+        alice.frames.clear()
+
+        await self.manager.send_message('a', 'solo')
+        await settle()
+
+        self.assertEqual(len(alice.frames), 1)
+        self.assertEqual(alice.frames[0]['message']['content'], 'solo')
+
+    async def test_drain_sends_queued_replies_and_stops_writer(self):
+        alice = await self.connect('a')
+        await self.manager._send_system_message('a', 'pendiente')
+
+        await self.manager.drain('a')
+
+        self.assertEqual([m['content'] for m in alice.of_type('system_message')], ['pendiente'])
+        self.assertTrue(self.manager.out_writers['a'].done())
+
+    async def test_overflow_closes_connection(self):
+        stuck = await self.connect('s', 'Sam', websocket=StuckWebSocket())
+        fast = await self.connect('f', 'Fay')
+
+        for i in range(ConnectionManager.MAX_PENDING + 1):
+            await self.manager.send_message('f', f'm{i}')
+            await asyncio.sleep(0)
+        await settle()
+
+        self.assertEqual(stuck.closed_code, 1008)
+        self.assertNotIn('s', self.manager.room_users['general'])
+        self.assertNotIn('s', self.manager.room_usernames['general'])
+        self.assertFalse((await self.manager.register_user('s', 'Sam2'))['success'])
+        self.assertIsNone(fast.closed_code)
+
+
+if __name__ == '__main__':
+    unittest.main()